@@ -2,6 +2,7 @@ import os
 import sys
 import time
 import base64 
+from concurrent.futures import ThreadPoolExecutor
 
 # --- 1. CONFIGURAÇÕES DE AMBIENTE (ANTI-TRAVAMENTO) ---
 os.environ["CREWAI_TELEMETRY_OPT_OUT"] = "true"
@@ -13,7 +14,8 @@ from agents import CWSCrewAgents
 from tasks import CWSCrewTasks
 # Importamos as ferramentas blindadas
 from tools import create_jira_issue_manual, get_jira_projects, get_jira_priorities, get_project_custom_fields_meta
-from file_handler import extract_text_from_file, generate_docx, generate_pdf
+from file_handler import extract_text_with_stats, generate_docx, generate_pdf
+from duplicate_index import get_duplicate_index
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -105,6 +107,38 @@ def extract_title_from_story(story_text):
         return clean_title[:100]
     return clean_title
 
+def generate_stories_in_parallel(agents, candidates, max_workers):
+    """Executa Arquiteto -> Revisor para cada história candidata, em paralelo (limitado por max_workers)."""
+    def run_story_crew(candidate):
+        try:
+            architect = agents.story_architect_agent()
+            gatekeeper = agents.gatekeeper_agent()
+
+            tasks = CWSCrewTasks()
+            out_of_scope = [c.title for c in candidates if c is not candidate]
+            t2 = tasks.drafting_task(architect, None, story_scope=f"{candidate.title}. {candidate.scope}", out_of_scope=out_of_scope)
+            t3 = tasks.publication_task(gatekeeper, [t2], "CWS-Plataform")
+
+            crew = Crew(
+                agents=[architect, gatekeeper],
+                tasks=[t2, t3],
+                process=Process.sequential,
+                verbose=True
+            )
+            result = crew.kickoff()
+            return {
+                'label': candidate.title[:100],
+                'title': extract_title_from_story(result.raw) or candidate.title[:100],
+                'story': result.raw,
+                'draft': t2.output.raw,
+            }
+        except Exception as e:
+            # Uma história com erro não derruba as demais
+            return {'label': candidate.title[:100], 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_story_crew, candidates))
+
 def main():
     # Configuração da Página
     st.set_page_config(page_title="CWS PM Assistant", page_icon="🚀", layout="wide", initial_sidebar_state="collapsed")
@@ -114,6 +148,10 @@ def main():
     MODEL_NAME = "gemini-2.5-flash"
     API_KEY = os.getenv("GOOGLE_API_KEY")
     JIRA_PROJECT_KEY = os.getenv("JIRA_PROJECT_KEY", "CWS")
+    MAX_STORIES = int(os.getenv("MAX_STORIES", "8"))
+    # Por padrão todas as histórias rodam numa única leva (tempo ~ 1 história);
+    # reduza se a cota de requisições por minuto do modelo não comportar MAX_STORIES pares simultâneos
+    MAX_PARALLEL_STORIES = int(os.getenv("MAX_PARALLEL_STORIES", str(MAX_STORIES)))
 
     # --- CARREGAMENTO DE DADOS JIRA ---
     @st.cache_data(ttl=3600)
@@ -177,19 +215,51 @@ def main():
                 key="input_file"
             )
             
+            file_loaded = False
             if uploaded_file:
-                with st.spinner("Lendo arquivo..."):
-                    extracted_text = extract_text_from_file(uploaded_file)
-                st.success(f"✅ Arquivo **{uploaded_file.name}** carregado com sucesso!")
-                final_input_text = f"ARQUIVO ({uploaded_file.name}):\n{extracted_text}"
-                if manual_text:
-                    final_input_text += f"\n\nOBSERVAÇÕES MANUAIS:\n{manual_text}"
+                file_id = getattr(uploaded_file, "file_id", uploaded_file.name)
+                extraction = st.session_state.get('extraction')
+
+                # Extrai uma única vez por arquivo (os reruns do Streamlit reaproveitam o texto)
+                if not extraction or extraction['file_id'] != file_id:
+                    with st.spinner("Lendo arquivo..."):
+                        extracted_text, stats = extract_text_with_stats(
+                            uploaded_file, max_file_mb=st.get_option("server.maxUploadSize")
+                        )
+                    extraction = {'file_id': file_id, 'text': extracted_text, 'stats': stats}
+                    # Só a falha transitória ("servidor ocupado") é tentada de novo no próximo rerun
+                    if not stats['retryable']:
+                        st.session_state['extraction'] = extraction
+
+                stats = extraction['stats']
+                if stats['error']:
+                    st.error(f"❌ Não foi possível ler **{uploaded_file.name}**: {stats['error']}")
+                    final_input_text = ""
+                else:
+                    file_loaded = True
+                    st.success(f"✅ Arquivo **{uploaded_file.name}** carregado com sucesso!")
+                    memory = ""
+                    if stats['peak_rss_mb'] is not None:
+                        memory = f" · pico de RSS {stats['peak_rss_mb']:.0f} MB (+{stats['rss_growth_mb']:.1f} MB na extração)"
+                    st.caption(f"{stats['file_mb']:.1f} MB · {stats['chars']:,} caracteres · {stats['seconds']:.1f}s{memory}")
+                    if stats['truncated']:
+                        st.warning("⚠️ O arquivo é muito extenso e foi truncado no limite de caracteres.")
+                    final_input_text = f"ARQUIVO ({uploaded_file.name}):\n{extraction['text']}"
+                    if manual_text:
+                        final_input_text += f"\n\nOBSERVAÇÕES MANUAIS:\n{manual_text}"
             else:
+                # Arquivo removido: libera o texto extraído da sessão
+                st.session_state.pop('extraction', None)
                 final_input_text = manual_text
 
-    if uploaded_file:
+    multi_story = st.toggle(
+        "🧩 Gerar várias histórias (uma por necessidade independente do input)",
+        key="multi_story"
+    )
+
+    if file_loaded:
         st.info(f"📎 **Fonte de Dados:** Utilizando arquivo '{uploaded_file.name}' como base principal.")
-    elif manual_text:
+    elif manual_text and not uploaded_file:
         st.info("✍️ **Fonte de Dados:** Utilizando texto digitado manualmente.")
 
     st.markdown("<br>", unsafe_allow_html=True)
@@ -198,13 +268,16 @@ def main():
     col_spacer1, col_btn, col_spacer2 = st.columns([1, 2, 1])
     
     with col_btn:
-        run_process = st.button("✨ GERAR HISTÓRIA DE USUÁRIO", type="primary", use_container_width=True)
+        button_label = "✨ GERAR HISTÓRIAS DE USUÁRIO" if multi_story else "✨ GERAR HISTÓRIA DE USUÁRIO"
+        run_process = st.button(button_label, type="primary", use_container_width=True)
 
     # --- LÓGICA DE EXECUÇÃO ---
     if run_process:
         if not final_input_text or len(final_input_text) < 5:
             st.toast("⚠️ Por favor, forneça um input válido.", icon="⚠️")
         else:
+            run_error = None
+            failed_stories = []
             progress_placeholder = st.empty()
             with progress_placeholder.container():
                 st.info("🤖 Os Agents da CWS estão trabalhando na sua história...")
@@ -213,46 +286,97 @@ def main():
                     try:
                         agents = CWSCrewAgents(google_api_key=API_KEY, model_name=MODEL_NAME)
                         analyst = agents.context_interpreter_agent()
-                        architect = agents.story_architect_agent()
-                        gatekeeper = agents.gatekeeper_agent()
-
                         tasks = CWSCrewTasks()
-                        t1 = tasks.analysis_task(analyst, final_input_text)
-                        t2 = tasks.drafting_task(architect, [t1])
-                        t3 = tasks.publication_task(gatekeeper, [t2], "CWS-Plataform")
-
-                        crew = Crew(
-                            agents=[analyst, architect, gatekeeper],
-                            tasks=[t1, t2, t3],
-                            process=Process.sequential,
-                            verbose=True 
-                        )
 
-                        result = crew.kickoff()
-                        
-                        st.session_state['final_story'] = result.raw
-                        st.session_state['task_outputs'] = [t1.output.raw, t2.output.raw]
-                        st.session_state['auto_title'] = extract_title_from_story(result.raw)
+                        if multi_story:
+                            # 1 análise -> N histórias candidatas -> N pares Arquiteto/Revisor em paralelo
+                            t1 = tasks.decomposition_task(analyst, final_input_text, MAX_STORIES)
+                            analysis_crew = Crew(
+                                agents=[analyst],
+                                tasks=[t1],
+                                process=Process.sequential,
+                                verbose=True
+                            )
+                            analysis_result = analysis_crew.kickoff()
+                            candidates = analysis_result.pydantic.stories[:MAX_STORIES] if analysis_result.pydantic else []
+                            if not candidates:
+                                raise ValueError("O Analista não identificou histórias no input.")
+
+                            st.info(f"🧩 {len(candidates)} história(s) identificada(s). Escrevendo em paralelo...")
+                            stories = generate_stories_in_parallel(agents, candidates, MAX_PARALLEL_STORIES)
+                            failed_stories = [s for s in stories if 'error' in s]
+                            stories = [s for s in stories if 'error' not in s]
+                            if not stories:
+                                raise ValueError("Nenhuma das histórias identificadas pôde ser gerada.")
+                        else:
+                            architect = agents.story_architect_agent()
+                            gatekeeper = agents.gatekeeper_agent()
+
+                            t1 = tasks.analysis_task(analyst, final_input_text)
+                            t2 = tasks.drafting_task(architect, [t1])
+                            t3 = tasks.publication_task(gatekeeper, [t2], "CWS-Plataform")
+
+                            crew = Crew(
+                                agents=[analyst, architect, gatekeeper],
+                                tasks=[t1, t2, t3],
+                                process=Process.sequential,
+                                verbose=True 
+                            )
+
+                            result = crew.kickoff()
+                            title = extract_title_from_story(result.raw)
+                            stories = [{
+                                'label': title,
+                                'title': title,
+                                'story': result.raw,
+                                'draft': t2.output.raw,
+                            }]
+
+                        st.session_state['stories'] = stories
+                        st.session_state.pop('story_selector', None)
+                        st.session_state['analysis'] = (
+                            "\n\n".join(f"**{c.title}**\n\n{c.scope}" for c in candidates) if multi_story else t1.output.raw
+                        )
                     
                     except Exception as e:
-                        st.error(f"Erro na execução: {str(e)}")
+                        run_error = str(e)
             
+            # Fora do placeholder: senão as mensagens somem junto com o progresso
             progress_placeholder.empty()
-            st.success("✅ Processo Finalizado com Sucesso!")
+            for failed in failed_stories:
+                st.warning(f"⚠️ Falha ao gerar '{failed['label']}': {failed['error']}")
+            if run_error:
+                st.error(f"Erro na execução: {run_error}")
+            else:
+                st.success("✅ Processo Finalizado com Sucesso!")
 
 
     # --- 3. ÁREA DE RESULTADO ---
-    if 'final_story' in st.session_state:
+    if st.session_state.get('stories'):
+        stories = st.session_state['stories']
         st.divider()
         st.markdown("### 2. 💎 Refinamento e Entrega")
 
+        story_idx = 0
+        if len(stories) > 1:
+            story_idx = st.selectbox(
+                f"📚 {len(stories)} histórias geradas. Selecione para revisar:",
+                options=range(len(stories)),
+                # Rótulo fixo (título original): editar o título não pode mudar o ID do widget
+                format_func=lambda i: f"{i + 1}. {stories[i]['label']}",
+                key="story_selector"
+            )
+        current_story = stories[story_idx]
+
         st.markdown("#### 🖊️ Editor da História")
         final_content_edited = st.text_area(
             label="Conteúdo Final (Markdown)",
-            value=st.session_state['final_story'],
+            value=current_story['story'],
             height=600,
             label_visibility="collapsed"
         )
+        # Guarda a edição na própria história (sobrevive à troca de história e à publicação em lote)
+        current_story['story'] = final_content_edited
         
         st.markdown("<br>", unsafe_allow_html=True)
 
@@ -260,10 +384,10 @@ def main():
         col_intel1, col_intel2 = st.columns(2)
         with col_intel1:
             with st.expander("🔍 Ver Análise Técnica (Analista)"):
-                st.markdown(st.session_state['task_outputs'][0])
+                st.markdown(st.session_state['analysis'])
         with col_intel2:
             with st.expander("📝 Ver Rascunho Inicial (Arquiteto)"):
-                st.markdown(st.session_state['task_outputs'][1])
+                st.markdown(current_story['draft'])
 
         st.markdown("<br>", unsafe_allow_html=True)
 
@@ -291,8 +415,8 @@ def main():
             j_col1, j_col2 = st.columns([3, 2])
             
             with j_col1:
-                default_title = st.session_state.get('auto_title', "")
-                ticket_title = st.text_input("1. Resumo (Título da Demanda) *", value=default_title, placeholder="Digite o título...")
+                ticket_title = st.text_input("1. Resumo (Título da Demanda) *", value=current_story['title'], placeholder="Digite o título...")
+                current_story['title'] = ticket_title
             
             with j_col2:
                 project_options = list(available_projects.keys())
@@ -335,9 +459,27 @@ def main():
             with j_col5:
                 needs_param_str = st.radio("5. Parametrização? *", param_options, horizontal=True)
 
+            # --- CHECAGEM DE DUPLICIDADE (ÍNDICE LOCAL) ---
+            if selected_project_key:
+                duplicate_index = get_duplicate_index(selected_project_key)
+                duplicate_index.refresh()  # Segundo plano: não trava a tela nem as outras sessões
+                if duplicate_index.syncing:
+                    st.caption(f"🔄 Sincronizando histórias existentes da Squad {selected_project_key}; a checagem de duplicidade pode estar incompleta.")
+                similar_issues = duplicate_index.search(
+                    f"{ticket_title}\n{final_content_edited}", exclude={current_story.get('ticket_id')}
+                )
+                if similar_issues:
+                    base_url = os.getenv("JIRA_SERVER_URL", "").rstrip("/")
+                    st.warning(f"⚠️ Encontramos {len(similar_issues)} história(s) parecida(s) em {selected_project_key}. Verifique antes de publicar:")
+                    for issue_key, issue_summary, score in similar_issues:
+                        st.markdown(f"- [{issue_key}]({base_url}/browse/{issue_key}) — {issue_summary} (similaridade: {score:.0%})")
+
             st.markdown("<br>", unsafe_allow_html=True)
+
+            if current_story.get('ticket_id'):
+                st.info(f"✅ Esta história já foi publicada como [{current_story['ticket_id']}]({current_story['ticket_link']}).")
             
-            if st.button("Confirmar e Criar Ticket Jira ➔", type="primary", use_container_width=True):
+            if st.button("Confirmar e Criar Ticket Jira ➔", type="primary", use_container_width=True, disabled=bool(current_story.get('ticket_id'))):
                 
                 missing_fields = []
                 if not ticket_title: missing_fields.append("Resumo")
@@ -359,6 +501,8 @@ def main():
                     )
                     
                     if ticket_id:
+                        current_story['ticket_id'], current_story['ticket_link'] = ticket_id, ticket_link
+                        get_duplicate_index(selected_project_key).refresh(force=True)
                         st.balloons()
                         st.markdown(f"""
                         <div style="background-color: #F3E5F5; padding: 20px; border-radius: 10px; text-align: center; border: 1px solid #9B1C68;">
@@ -370,5 +514,56 @@ def main():
                     else:
                         st.error(ticket_link)
 
+            # --- PUBLICAÇÃO EM LOTE (MODO MULTI-HISTÓRIAS) ---
+            pending_stories = [story for story in stories if not story.get('ticket_id')]
+            if len(stories) > 1 and pending_stories:
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown(f"#### 📦 Publicação em Lote ({len(pending_stories)} pendente(s) de {len(stories)})")
+
+                if selected_project_key:
+                    base_url = os.getenv("JIRA_SERVER_URL", "").rstrip("/")
+                    duplicate_index = get_duplicate_index(selected_project_key)
+                    for story in pending_stories:
+                        similar_issues = duplicate_index.search(f"{story['title']}\n{story['story']}", top_k=3)
+                        if similar_issues:
+                            links = ", ".join(
+                                f"[{issue_key}]({base_url}/browse/{issue_key}) ({score:.0%})" for issue_key, _, score in similar_issues
+                            )
+                            st.warning(f"⚠️ **{story['title']}** parece com: {links}")
+
+                if st.button(f"Publicar {len(pending_stories)} história(s) pendente(s) ➔", type="secondary", use_container_width=True):
+
+                    missing_fields = []
+                    if not selected_project_key: missing_fields.append("Espaço (Squad)")
+                    if not priority: missing_fields.append("Prioridade")
+                    if not client_sponsor: missing_fields.append("Cliente/Sponsor")
+
+                    if missing_fields:
+                        st.error(f"❌ Campos obrigatórios faltando: {', '.join(missing_fields)}")
+                    else:
+                        created = 0
+                        with st.spinner(f"Publicando {len(pending_stories)} histórias..."):
+                            for story in pending_stories:
+                                ticket_id, ticket_link = create_jira_issue_manual(
+                                    project_key=selected_project_key,
+                                    summary=story['title'],
+                                    description=story['story'],
+                                    priority=priority,
+                                    client_value=client_sponsor,
+                                    param_value=needs_param_str,
+                                    custom_field_meta=meta_fields
+                                )
+                                if ticket_id:
+                                    # Marcada como publicada: um novo clique (após falha parcial) não duplica
+                                    story['ticket_id'], story['ticket_link'] = ticket_id, ticket_link
+                                    created += 1
+                                    st.markdown(f"✅ [{ticket_id}]({ticket_link}) — {story['title']}")
+                                else:
+                                    st.error(f"{story['title']}: {ticket_link}")
+
+                        if created:
+                            get_duplicate_index(selected_project_key).refresh(force=True)
+                            st.balloons()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+# --- CONFIG ---
+INDEX_DIR = os.getenv("JIRA_INDEX_DIR", ".jira_index")
+SYNC_INTERVAL_SECONDS = 300
+RECONCILE_INTERVAL_SECONDS = 24 * 3600
+MAX_TEXT_CHARS = 4000
+APPLY_BATCH_SIZE = 100
+MAX_QUERY_TERMS = 100
+
+STOPWORDS = {
+    "que", "para", "com", "uma", "um", "dos", "das", "nos", "nas", "por", "como", "mais",
+    "ser", "sua", "seu", "ao", "aos", "na", "no", "da", "do", "de", "em", "os", "as", "e", "o", "a",
+    "quero", "poder", "deve", "eu", "the", "and", "for", "with", "dado", "quando", "entao",
+}
+
+def _tokenize(text):
+    """Normaliza (minúsculas, sem acentos) e quebra em termos relevantes."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r"[a-z0-9]+", text) if len(t) > 2 and t not in STOPWORDS]
+
+def _weight(tf):
+    return 1 + math.log(tf)
+
+class JiraDuplicateIndex:
+    """
+    Índice TF-IDF local (índice invertido) de resumo + descrição das issues de um projeto.
+
+    Pontuação no esquema SMART lnc.ltc: documentos com log-tf normalizado (a norma de uma issue
+    não depende do resto do corpus) e idf aplicado só na consulta. Assim cada upsert atualiza
+    apenas a própria issue e a busca nunca precisa recalcular o índice inteiro.
+    """
+
+    def __init__(self, project_key, fetch_updated=None, fetch_keys=None, index_dir=INDEX_DIR):
+        if fetch_updated is None or fetch_keys is None:
+            from tools import search_jira_issues_updated_since, list_jira_issue_keys
+            fetch_updated = fetch_updated or search_jira_issues_updated_since
+            fetch_keys = fetch_keys or list_jira_issue_keys
+
+        self.project_key = project_key
+        self.index_dir = index_dir
+        self.path = os.path.join(index_dir, f"{project_key}.sqlite3")
+        self._fetch_updated = fetch_updated
+        self._fetch_keys = fetch_keys
+
+        self.last_sync = None          # epoch do último sync bem-sucedido
+        self.last_reconcile = None     # epoch da última remoção de excluídas/movidas
+        self.loaded = False
+        self.issues = {}               # key -> {"summary", "terms": {termo: tf}}
+        self.postings = defaultdict(dict)  # termo -> {key: peso log-tf}
+        self.norms = {}                # key -> norma do vetor log-tf
+
+        self._lock = threading.Lock()       # protege as estruturas do índice
+        self._sync_lock = threading.Lock()  # um sync por vez
+        self._thread = None
+
+    # --- PERSISTÊNCIA (SQLite: o sync grava só as issues alteradas) ---
+    def _connect(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS issues (key TEXT PRIMARY KEY, summary TEXT, terms TEXT)")
+        return conn
+
+    def _load(self):
+        conn = self._connect()
+        try:
+            meta = dict(conn.execute("SELECT name, value FROM meta"))
+            rows = conn.execute("SELECT key, summary, terms FROM issues")
+            for chunk in iter(lambda: rows.fetchmany(1000), []):
+                with self._lock:
+                    for key, summary, terms in chunk:
+                        self._index(key, summary, json.loads(terms))
+        finally:
+            conn.close()
+        self.last_sync = meta.get("last_sync")
+        self.last_reconcile = meta.get("last_reconcile")
+        self.loaded = True
+
+    def _save(self, conn, upserted=(), removed=()):
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO issues (key, summary, terms) VALUES (?, ?, ?)",
+                [(key, summary, json.dumps(terms, ensure_ascii=False)) for key, summary, terms in upserted]
+            )
+            conn.executemany("DELETE FROM issues WHERE key = ?", [(key,) for key in removed])
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                [("last_sync", self.last_sync), ("last_reconcile", self.last_reconcile)]
+            )
+
+    # --- INDEXAÇÃO (chamador segura self._lock) ---
+    def _remove(self, key):
+        issue = self.issues.pop(key, None)
+        if not issue: return
+        for term in issue["terms"]:
+            self.postings[term].pop(key, None)
+            if not self.postings[term]:
+                del self.postings[term]
+        self.norms.pop(key, None)
+
+    def _index(self, key, summary, terms):
+        self._remove(key)
+        self.issues[key] = {"summary": summary, "terms": terms}
+        for term, tf in terms.items():
+            self.postings[term][key] = _weight(tf)
+        self.norms[key] = math.sqrt(sum(_weight(tf) ** 2 for tf in terms.values())) or 1.0
+
+    # --- SINCRONIZAÇÃO INCREMENTAL ---
+    def _apply(self, conn, batch):
+        # Tokeniza fora do lock; o resumo pesa em dobro (é o que mais denuncia uma duplicata)
+        terms_batch = [
+            (key, summary, dict(Counter(_tokenize(summary) * 2 + _tokenize(description[:MAX_TEXT_CHARS]))))
+            for key, summary, description in batch
+        ]
+        with self._lock:
+            for key, summary, terms in terms_batch:
+                self._index(key, summary, terms)
+        self._save(conn, upserted=terms_batch)
+
+    def _reconcile(self, conn, now):
+        """Remove issues excluídas ou movidas de projeto (o filtro por `updated` não as enxerga)."""
+        keys = self._fetch_keys(self.project_key)
+        if keys is None: return
+        keys = set(keys)
+        with self._lock:
+            removed = [k for k in self.issues if k not in keys]
+            for key in removed:
+                self._remove(key)
+        self.last_reconcile = now
+        self._save(conn, removed=removed)
+
+    def sync(self, force=False):
+        """
+        Busca no Jira apenas o que mudou desde o último sync (updated >= last_sync).
+        As páginas são buscadas fora do lock; buscas concorrentes só esperam a aplicação de cada lote.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return 0  # Outro sync já está em andamento
+        try:
+            if not self.loaded:
+                self._load()
+
+            now = time.time()
+            if not force and self.last_sync and now - self.last_sync < SYNC_INTERVAL_SECONDS:
+                return 0
+
+            since = None
+            if self.last_sync:
+                # Data relativa ("-Nm") evita divergência de fuso entre app e Jira; +1 min de folga
+                minutes = int((now - self.last_sync) // 60) + 1
+                since = f"-{minutes}m"
+
+            count = 0
+            batch = []
+            conn = self._connect()
+            try:
+                if since and (not self.last_reconcile or now - self.last_reconcile >= RECONCILE_INTERVAL_SECONDS):
+                    self._reconcile(conn, now)
+
+                updated_issues = self._fetch_updated(self.project_key, since)
+                if updated_issues is None:
+                    return 0  # Sem credenciais: nada foi buscado, então o sync não conta como feito
+
+                for key, summary, description, _updated in updated_issues:
+                    batch.append((key, summary, description))
+                    if len(batch) >= APPLY_BATCH_SIZE:
+                        self._apply(conn, batch)
+                        count += len(batch)
+                        batch = []
+                self._apply(conn, batch)
+                count += len(batch)
+
+                self.last_sync = now
+                if not since:
+                    self.last_reconcile = now  # Sync completo já reflete o projeto atual
+                self._save(conn)
+            except Exception as e:
+                print(f"Erro ao sincronizar índice {self.project_key}: {e}")
+            finally:
+                conn.close()
+            return count
+        finally:
+            self._sync_lock.release()
+
+    def refresh(self, force=False):
+        """Carrega/sincroniza em segundo plano, sem bloquear a renderização."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.sync, kwargs={"force": force}, daemon=True)
+        self._thread.start()
+
+    @property
+    def syncing(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    # --- BUSCA ---
+    def search(self, text, top_k=5, min_score=0.2, exclude=()):
+        """Retorna [(key, summary, score)] das issues mais parecidas com o texto."""
+        query_terms = Counter(_tokenize(text))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            total = len(self.issues)
+            # idf calculado na hora, só para os termos da consulta
+            query_weights = {
+                term: _weight(tf) * (math.log((total + 1) / (len(self.postings.get(term, {})) + 1)) + 1)
+                for term, tf in query_terms.items()
+            }
+            # Consultas longas (a história inteira): só os termos mais raros/discriminantes contam
+            top_terms = sorted(query_weights.items(), key=lambda item: item[1], reverse=True)[:MAX_QUERY_TERMS]
+            # Termos ausentes no índice também contam na norma (penalizam a similaridade)
+            query_norm = math.sqrt(sum(w ** 2 for _, w in top_terms)) or 1.0
+
+            scores = defaultdict(float)
+            for term, q_weight in top_terms:
+                for key, d_weight in self.postings.get(term, {}).items():
+                    scores[key] += q_weight * d_weight
+
+            results = [
+                (key, self.issues[key]["summary"], score / (query_norm * self.norms[key]))
+                for key, score in scores.items() if key not in exclude
+            ]
+
+        results = [r for r in results if r[2] >= min_score]
+        results.sort(key=lambda r: r[2], reverse=True)
+        return results[:top_k]
+
+# --- INSTÂNCIAS POR PROJETO ---
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_duplicate_index(project_key):
+    """Retorna o índice do projeto (carregado do disco em segundo plano, no primeiro refresh)."""
+    with _indexes_lock:
+        if project_key not in _indexes:
+            _indexes[project_key] = JiraDuplicateIndex(project_key)
+        return _indexes[project_key]
@@ -1,47 +1,279 @@
 import io
+import os
+import time
+import zipfile
+import posixpath
+import threading
+import xml.etree.ElementTree as ET
 import pandas as pd
+from openpyxl import load_workbook
 from pypdf import PdfReader
 from docx import Document
-from pptx import Presentation
 from fpdf import FPDF
 
-def extract_text_from_file(uploaded_file):
-    """Lê o arquivo baseado na extensão e retorna texto puro."""
+# --- LIMITES DE UPLOAD (MEMÓRIA) ---
+MAX_FILE_MB = 50  # Padrão; o app passa o server.maxUploadSize configurado no Streamlit
+MAX_INFLIGHT_MB = int(os.getenv("MAX_INFLIGHT_UPLOAD_MB", "200"))  # Soma dos arquivos em extração (todas as sessões)
+INFLIGHT_WAIT_SECONDS = 30
+MAX_EXTRACTED_CHARS = int(os.getenv("MAX_EXTRACTED_CHARS", "200000"))
+MAX_XLS_ROWS = 5000
+READ_CHUNK_CHARS = 64 * 1024
+TRUNCATION_NOTICE = "\n\n[... conteúdo truncado: limite de caracteres atingido ...]"
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+RSS_SAMPLE_SECONDS = 0.02
+
+class UploadBusyError(RuntimeError):
+    """Falha transitória: o orçamento de memória de extração do processo está esgotado."""
+
+class _TextBuffer:
+    """Acumula trechos de texto e para de crescer ao atingir o limite de caracteres."""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+
+    @property
+    def full(self):
+        return self.size >= self.max_chars
+
+    def add(self, text):
+        if self.full or not text: return
+        text = text[:self.max_chars - self.size]
+        self.parts.append(text)
+        self.size += len(text)
+
+    def value(self):
+        text = "".join(self.parts)
+        return text + TRUNCATION_NOTICE if self.full else text
+
+# --- EXTRATORES POR FORMATO (escrevem no buffer limitado e param no teto) ---
+def _extract_txt(uploaded_file, buffer):
+    # Decodifica em blocos, sem materializar o arquivo inteiro em bytes + str
+    reader = io.TextIOWrapper(uploaded_file, encoding="utf-8")
+    try:
+        while not buffer.full:
+            chunk = reader.read(READ_CHUNK_CHARS)
+            if not chunk: break
+            buffer.add(chunk)
+    finally:
+        reader.detach()  # Não fecha o arquivo do Streamlit
+
+def _extract_pdf(uploaded_file, buffer):
+    # O pypdf lê as páginas sob demanda; paramos na primeira que estoura o limite
+    reader = PdfReader(uploaded_file)
+    for page in reader.pages:
+        if buffer.full: break
+        buffer.add(page.extract_text() + "\n")
+
+def _iter_ooxml_paragraphs(xml_file, paragraph_tag, text_tag, special_tags):
+    """
+    Percorre o XML em streaming (iterparse) e gera o texto de cada parágrafo.
+    special_tags mapeia tags sem texto (tabulação, quebra de linha) para o caractere equivalente.
+    Cada parágrafo lido é removido do pai, então a árvore não cresce com o documento.
+    """
+    parts = []
+    parents = []
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == text_tag:
+            parts.append(elem.text or "")
+        elif elem.tag in special_tags:
+            parts.append(special_tags[elem.tag])
+        elif elem.tag == paragraph_tag:
+            yield "".join(parts)
+            parts = []
+            if parents:
+                parents[-1].remove(elem)
+
+def _extract_docx(uploaded_file, buffer):
+    special_tags = {f"{W_NS}tab": "\t", f"{W_NS}br": "\n", f"{W_NS}cr": "\n"}
+    with zipfile.ZipFile(uploaded_file) as zf, zf.open("word/document.xml") as xml_file:
+        for paragraph in _iter_ooxml_paragraphs(xml_file, f"{W_NS}p", f"{W_NS}t", special_tags):
+            if buffer.full: break
+            buffer.add(paragraph + "\n")
+
+def _pptx_slide_parts(zf):
+    """Partes dos slides na ordem da apresentação (p:sldIdLst + relacionamentos), como o python-pptx."""
+    with zf.open("ppt/_rels/presentation.xml.rels") as rels_file:
+        targets = {rel.get("Id"): rel.get("Target") for rel in ET.parse(rels_file).getroot().iter(f"{REL_NS}Relationship")}
+    with zf.open("ppt/presentation.xml") as presentation_file:
+        slide_ids = ET.parse(presentation_file).getroot().iter(f"{P_NS}sldId")
+        rel_ids = [slide_id.get(f"{R_NS}id") for slide_id in slide_ids]
+
+    parts = []
+    for rel_id in rel_ids:
+        target = targets.get(rel_id)
+        if not target: continue
+        # Target é relativo a ppt/ (ou absoluto, começando com "/")
+        parts.append(target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("ppt", target)))
+    return parts
+
+def _extract_pptx(uploaded_file, buffer):
+    with zipfile.ZipFile(uploaded_file) as zf:
+        for slide in _pptx_slide_parts(zf):
+            if buffer.full: break
+            with zf.open(slide) as xml_file:
+                for paragraph in _iter_ooxml_paragraphs(xml_file, f"{A_NS}p", f"{A_NS}t", {f"{A_NS}br": "\n"}):
+                    buffer.add(paragraph + "\n")
+
+def _extract_xlsx(uploaded_file, buffer):
+    # read_only: as linhas são lidas do XML sob demanda, não a planilha inteira
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            buffer.add(f"## {ws.title}\n")
+            for row in ws.iter_rows(values_only=True):
+                if buffer.full: return
+                buffer.add("\t".join("" if value is None else str(value) for value in row) + "\n")
+    finally:
+        wb.close()
+
+def _extract_xls(uploaded_file, buffer):
+    # Formato binário antigo: sem leitura sob demanda; limitamos por linhas
+    df = pd.read_excel(uploaded_file, nrows=MAX_XLS_ROWS)
+    buffer.add(df.to_string())
+
+EXTRACTORS = {
+    'txt': _extract_txt,
+    'md': _extract_txt,
+    'pdf': _extract_pdf,
+    'docx': _extract_docx,
+    'pptx': _extract_pptx,
+    'xlsx': _extract_xlsx,
+    'xls': _extract_xls,
+}
+
+# --- CONTROLE DE MEMÓRIA ENTRE SESSÕES ---
+_inflight_bytes = 0
+_inflight_cond = threading.Condition()
+
+def _reserve_inflight(size):
+    """
+    Limita a soma dos arquivos sendo extraídos ao mesmo tempo no processo (todas as sessões),
+    que é o que estoura a memória quando vários usuários sobem arquivos grandes juntos.
+    """
+    global _inflight_bytes
+    limit = MAX_INFLIGHT_MB * 1024 * 1024
+    with _inflight_cond:
+        # Um arquivo sozinho sempre passa (o limite por arquivo já foi checado)
+        if not _inflight_cond.wait_for(lambda: _inflight_bytes == 0 or _inflight_bytes + size <= limit, INFLIGHT_WAIT_SECONDS):
+            raise UploadBusyError("Servidor ocupado processando outros arquivos. Tente novamente em instantes.")
+        _inflight_bytes += size
+
+def _release_inflight(size):
+    global _inflight_bytes
+    with _inflight_cond:
+        _inflight_bytes -= size
+        _inflight_cond.notify_all()
+
+def _rss_mb():
+    """RSS atual do processo em MB (Linux, via /proc). None se indisponível."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+class _PeakRssSampler:
+    """
+    Amostra o RSS numa thread leve enquanto a extração roda e guarda o pico.
+    Não interfere nas outras sessões (ao contrário de tracemalloc ou de zerar o VmHWM do processo).
+    """
+
+    def __init__(self):
+        self.peak = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self._sample()
+
+    def _sample(self):
+        rss = _rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        if self.peak is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sample()
+
+def _extract(uploaded_file, max_chars, max_file_mb):
     file_type = uploaded_file.name.split('.')[-1].lower()
-    
+    extractor = EXTRACTORS.get(file_type)
+    if not extractor:
+        raise ValueError("Formato não suportado.")
+
+    file_size = getattr(uploaded_file, "size", 0)
+    if file_size > max_file_mb * 1024 * 1024:
+        raise ValueError(f"Arquivo excede o limite de {max_file_mb} MB.")
+
+    buffer = _TextBuffer(max_chars)
+    _reserve_inflight(file_size)
     try:
-        if file_type in ['txt', 'md']:
-            return uploaded_file.read().decode("utf-8")
-        
-        elif file_type == 'pdf':
-            reader = PdfReader(uploaded_file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        
-        elif file_type == 'docx':
-            doc = Document(uploaded_file)
-            return "\n".join([para.text for para in doc.paragraphs])
-        
-        elif file_type == 'pptx':
-            prs = Presentation(uploaded_file)
-            text = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text.append(shape.text)
-            return "\n".join(text)
-        
-        elif file_type in ['xlsx', 'xls']:
-            df = pd.read_excel(uploaded_file)
-            return df.to_string()
-            
-        else:
-            return "Formato não suportado."
+        uploaded_file.seek(0)
+        extractor(uploaded_file, buffer)
+    finally:
+        _release_inflight(file_size)
+    return buffer.value()
+
+def extract_text_from_file(uploaded_file, max_chars=MAX_EXTRACTED_CHARS, max_file_mb=MAX_FILE_MB):
+    """Lê o arquivo baseado na extensão e retorna texto puro (ou a mensagem de erro)."""
+    try:
+        return _extract(uploaded_file, max_chars, max_file_mb)
     except Exception as e:
         return f"Erro ao ler arquivo: {str(e)}"
 
+def extract_text_with_stats(uploaded_file, max_chars=MAX_EXTRACTED_CHARS, max_file_mb=MAX_FILE_MB):
+    """
+    Extrai o texto e retorna (texto, métricas). Em caso de falha o texto é "" e stats['error'] traz o motivo;
+    stats['retryable'] indica falha transitória (servidor ocupado). peak_rss_mb é o pico de RSS do processo
+    durante a extração e rss_growth_mb quanto ele subiu acima do RSS inicial.
+    """
+    start = time.perf_counter()
+    text, error, retryable = "", None, False
+    with _PeakRssSampler() as sampler:
+        rss_before = sampler.peak
+        try:
+            text = _extract(uploaded_file, max_chars, max_file_mb)
+        except UploadBusyError as e:
+            error, retryable = str(e), True
+        except Exception as e:
+            error = str(e)
+
+    if error:
+        print(f"Erro ao extrair '{uploaded_file.name}': {error}")
+
+    return text, {
+        "error": error,
+        "retryable": retryable,
+        "file_mb": getattr(uploaded_file, "size", 0) / (1024 * 1024),
+        "chars": len(text),
+        "truncated": text.endswith(TRUNCATION_NOTICE),
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": sampler.peak,
+        "rss_growth_mb": sampler.peak - rss_before if rss_before is not None else None,
+    }
+
 def generate_docx(text):
     doc = Document()
     doc.add_heading('História de Usuário (CWS)', 0)
@@ -1,4 +1,13 @@
 from crewai import Task
+from pydantic import BaseModel, Field
+
+# --- SAÍDA ESTRUTURADA (MODO MULTI-HISTÓRIAS) ---
+class StoryCandidate(BaseModel):
+    title: str = Field(..., description="Título curto da história candidata")
+    scope: str = Field(..., description="Escopo da história: objetivo, personas e riscos técnicos relevantes")
+
+class StoryCandidates(BaseModel):
+    stories: list[StoryCandidate] = Field(..., description="Histórias independentes identificadas no input")
 
 class CWSCrewTasks:
     def analysis_task(self, agent, inputs):
@@ -12,10 +21,37 @@ class CWSCrewTasks:
             agent=agent
         )
 
-    def drafting_task(self, agent, context):
+    def decomposition_task(self, agent, inputs, max_stories=8):
+        return Task(
+            description=(
+                f"1. Analise o input: {inputs}.\n"
+                "2. Identifique Objetivos, Personas e Riscos Técnicos e separe o input em "
+                f"histórias de usuário INDEPENDENTES (no máximo {max_stories}).\n"
+                "3. Para cada história, descreva um escopo autossuficiente: quem for escrevê-la "
+                "não terá acesso ao input original.\n"
+                "4. Responda estritamente em PORTUGUÊS DO BRASIL."
+            ),
+            expected_output="Lista de histórias candidatas (título e escopo) em PT-BR.",
+            output_pydantic=StoryCandidates,
+            agent=agent
+        )
+
+    def drafting_task(self, agent, context, story_scope=None, out_of_scope=None):
+        if story_scope:
+            # Modo multi-histórias: não há relatório técnico no contexto, só o escopo da candidata
+            source_text = (
+                f"Escreva a História de Usuário a partir do escopo abaixo (é a sua única fonte):\n{story_scope}\n"
+            )
+            if out_of_scope:
+                source_text += (
+                    "NÃO cubra o que pertence às outras histórias do mesmo discovery: "
+                    + "; ".join(out_of_scope) + ".\n"
+                )
+        else:
+            source_text = "Escreva a História de Usuário baseada no relatório técnico.\n"
         return Task(
             description=(
-                "Escreva a História de Usuário baseada no relatório técnico.\n"
+                source_text +
                 "Estrutura: Título, Contexto, Objetivo, Critérios de Aceite (Gherkin).\n"
                 "IMPORTANTE: O Título deve ser claro, objetivo e ter NO MÁXIMO 100 caracteres.\n"
                 "Idioma Obrigatório: PORTUGUÊS DO BRASIL."
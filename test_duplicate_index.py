@@ -0,0 +1,94 @@
+from duplicate_index import JiraDuplicateIndex
+
+ISSUES = {
+    "CWS-1": ("Parametrizar limite de crédito por cliente", "Admin configura o limite de crédito de cada cliente no painel."),
+    "CWS-2": ("Exportar pedidos em CSV", "Vendedor exporta a lista de pedidos do mês em CSV."),
+    "CWS-3": ("Login com SSO corporativo", "Usuários entram com a conta corporativa via SAML."),
+}
+
+class FakeJira:
+    def __init__(self, issues):
+        self.issues = dict(issues)
+        self.since_calls = []
+
+    def fetch_updated(self, project_key, since=None):
+        self.since_calls.append(since)
+        for key, (summary, description) in self.issues.items():
+            yield key, summary, description, ""
+
+    def fetch_keys(self, project_key):
+        return list(self.issues)
+
+def _index(tmp_path, jira):
+    return JiraDuplicateIndex("CWS", jira.fetch_updated, jira.fetch_keys, index_dir=str(tmp_path))
+
+def test_search_finds_near_duplicate(tmp_path):
+    index = _index(tmp_path, FakeJira(ISSUES))
+    index.sync()
+
+    results = index.search("Permitir parametrizar o limite de crédito de cada cliente")
+
+    assert results[0][0] == "CWS-1"
+    assert all(key != "CWS-3" for key, _, _ in results)
+
+def test_search_excludes_keys(tmp_path):
+    index = _index(tmp_path, FakeJira(ISSUES))
+    index.sync()
+
+    assert index.search("Exportar pedidos em CSV", exclude={"CWS-2"}) == []
+
+def test_incremental_sync_uses_relative_date_and_updates_issue(tmp_path):
+    jira = FakeJira(ISSUES)
+    index = _index(tmp_path, jira)
+    index.sync()
+
+    jira.issues = {"CWS-2": ("Exportar faturas em PDF", "Financeiro baixa as faturas em PDF.")}
+    assert index.sync(force=True) == 1
+
+    assert jira.since_calls[0] is None
+    assert jira.since_calls[1].startswith("-") and jira.since_calls[1].endswith("m")
+    assert index.search("Lista de pedidos do mês em CSV") == []
+    assert index.search("Exportar faturas em PDF")[0][0] == "CWS-2"
+
+def test_sync_is_throttled(tmp_path):
+    jira = FakeJira(ISSUES)
+    index = _index(tmp_path, jira)
+    index.sync()
+
+    assert index.sync() == 0
+    assert len(jira.since_calls) == 1
+
+def test_reconcile_removes_deleted_issues(tmp_path):
+    jira = FakeJira(ISSUES)
+    index = _index(tmp_path, jira)
+    index.sync()
+
+    del jira.issues["CWS-3"]
+    index.last_reconcile = 0
+    index.sync(force=True)
+
+    assert "CWS-3" not in index.issues
+    assert index.search("Login com SSO corporativo") == []
+
+def test_index_persists_between_instances(tmp_path):
+    jira = FakeJira(ISSUES)
+    _index(tmp_path, jira).sync()
+
+    reloaded = _index(tmp_path, FakeJira({}))
+    reloaded.sync()  # Dentro do intervalo: só carrega do disco
+
+    assert set(reloaded.issues) == set(ISSUES)
+    assert reloaded.search("Login com SSO corporativo")[0][0] == "CWS-3"
+
+def test_sync_without_jira_client_does_not_mark_as_synced(tmp_path):
+    jira = FakeJira(ISSUES)
+    index = JiraDuplicateIndex("CWS", lambda project_key, since=None: None, lambda project_key: None, index_dir=str(tmp_path))
+    index.sync()
+
+    assert index.last_sync is None
+
+    # Com credenciais, o próximo sync ainda é completo
+    index._fetch_updated = jira.fetch_updated
+    index.sync()
+    assert jira.since_calls == [None]
+    assert set(index.issues) == set(ISSUES)
@@ -0,0 +1,119 @@
+import io
+import zipfile
+from docx import Document
+from openpyxl import Workbook
+import file_handler
+from file_handler import extract_text_with_stats, TRUNCATION_NOTICE
+
+class FakeUpload(io.BytesIO):
+    """Imita o UploadedFile do Streamlit (BytesIO com name e size)."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+    @property
+    def size(self):
+        return len(self.getbuffer())
+
+def _docx_bytes():
+    doc = Document()
+    paragraph = doc.add_paragraph()
+    run = paragraph.add_run("Nome:")
+    run.add_tab()
+    run = paragraph.add_run("João")
+    run.add_break()
+    paragraph.add_run("Linha2")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Célula A"
+    table.cell(0, 1).text = "Célula B"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def _pptx_bytes(slides_in_deck_order):
+    """PPTX mínimo em que a ordem do deck (sldIdLst) difere da numeração das partes slideN.xml."""
+    p_ns = "http://schemas.openxmlformats.org/presentationml/2006/main"
+    a_ns = "http://schemas.openxmlformats.org/drawingml/2006/main"
+    r_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    rel_ns = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+    sld_ids = "".join(
+        f'<p:sldId id="{256 + i}" r:id="rId{i + 10}"/>' for i in range(len(slides_in_deck_order))
+    )
+    rels = "".join(
+        f'<Relationship Id="rId{i + 10}" Type="{r_ns}/slide" Target="slides/{part}"/>'
+        for i, (part, _) in enumerate(slides_in_deck_order)
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr(
+            "ppt/presentation.xml",
+            f'<p:presentation xmlns:p="{p_ns}" xmlns:r="{r_ns}"><p:sldIdLst>{sld_ids}</p:sldIdLst></p:presentation>'
+        )
+        zf.writestr("ppt/_rels/presentation.xml.rels", f'<Relationships xmlns="{rel_ns}">{rels}</Relationships>')
+        for part, text in slides_in_deck_order:
+            zf.writestr(
+                f"ppt/slides/{part}",
+                f'<p:sld xmlns:p="{p_ns}" xmlns:a="{a_ns}"><a:p><a:r><a:t>{text}</a:t></a:r><a:br/>'
+                f'<a:r><a:t>fim</a:t></a:r></a:p></p:sld>'
+            )
+    return buffer.getvalue()
+
+def test_txt_is_truncated_at_max_chars():
+    text, stats = extract_text_with_stats(FakeUpload(("abc " * 1000).encode(), "a.txt"), max_chars=100)
+
+    assert text == ("abc " * 25) + TRUNCATION_NOTICE
+    assert stats["truncated"] and stats["error"] is None
+
+def test_invalid_utf8_sets_error():
+    text, stats = extract_text_with_stats(FakeUpload(b"\xff\xfe\xfa invalido", "a.txt"))
+
+    assert text == ""
+    assert stats["error"] and not stats["retryable"]
+
+def test_file_over_limit_is_rejected():
+    text, stats = extract_text_with_stats(FakeUpload(b"x" * (2 * 1024 * 1024), "a.txt"), max_file_mb=1)
+
+    assert text == ""
+    assert "1 MB" in stats["error"]
+
+def test_docx_keeps_tabs_breaks_and_tables():
+    text, stats = extract_text_with_stats(FakeUpload(_docx_bytes(), "a.docx"))
+
+    assert stats["error"] is None
+    assert "Nome:\tJoão\nLinha2\n" in text
+    assert "Célula A\n" in text and "Célula B\n" in text
+
+def test_pptx_follows_deck_order():
+    deck = [("slide2.xml", "Primeiro"), ("slide10.xml", "Segundo"), ("slide1.xml", "Terceiro")]
+    text, stats = extract_text_with_stats(FakeUpload(_pptx_bytes(deck), "a.pptx"))
+
+    assert stats["error"] is None
+    assert text == "Primeiro\nfim\nSegundo\nfim\nTerceiro\nfim\n"
+
+def test_xlsx_reads_all_sheets_and_stops_at_cap():
+    wb = Workbook()
+    wb.active.title = "Resumo"
+    wb.active.append(["Cliente", "Valor"])
+    wb.active.append(["ACME", 10])
+    details = wb.create_sheet("Detalhes")
+    for i in range(10000):
+        details.append([f"linha {i}", i])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+
+    text, stats = extract_text_with_stats(FakeUpload(buffer.getvalue(), "a.xlsx"), max_chars=500)
+
+    assert text.startswith("## Resumo\nCliente\tValor\nACME\t10\n## Detalhes\nlinha 0\t0\n")
+    assert stats["truncated"]
+    assert len(text) == 500 + len(TRUNCATION_NOTICE)
+
+def test_busy_server_is_retryable(monkeypatch):
+    monkeypatch.setattr(file_handler, "_inflight_bytes", file_handler.MAX_INFLIGHT_MB * 1024 * 1024)
+    monkeypatch.setattr(file_handler, "INFLIGHT_WAIT_SECONDS", 0)
+
+    text, stats = extract_text_with_stats(FakeUpload(b"abc", "a.txt"))
+
+    assert text == ""
+    assert stats["retryable"]
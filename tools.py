@@ -85,6 +85,61 @@ def get_project_custom_fields_meta(project_key):
         print(f"Erro ao buscar metadados: {e}")
         return meta_data
 
+# --- BUSCA PAGINADA (SINCRONIZAÇÃO DO ÍNDICE DE DUPLICIDADE) ---
+def _search_jql(jira, jql, fields, page_size):
+    """Pagina o /rest/api/3/search/jql (Jira Cloud) via nextPageToken."""
+    next_page_token = None
+    while True:
+        params = {"jql": jql, "maxResults": page_size, "fields": fields}
+        if next_page_token:
+            params["nextPageToken"] = next_page_token
+        response = jira.get("rest/api/3/search/jql", params=params) or {}
+        for issue in response.get('issues', []):
+            yield issue
+
+        next_page_token = response.get('nextPageToken')
+        if not next_page_token or response.get('isLast'):
+            break
+
+def _adf_to_text(node):
+    """Converte uma descrição em ADF (Atlassian Document Format, API v3) para texto puro."""
+    if isinstance(node, str): return node
+    if isinstance(node, list): return "".join(_adf_to_text(n) for n in node)
+    if not isinstance(node, dict): return ""
+    if node.get('type') == 'hardBreak': return "\n"
+    text = node.get('text', "") + _adf_to_text(node.get('content', []))
+    return text + "\n" if node.get('type') in ('paragraph', 'heading', 'listItem', 'codeBlock') else text
+
+def search_jira_issues_updated_since(project_key, since=None, page_size=100):
+    """
+    Retorna um iterador de (key, summary, description, updated) das issues do projeto alteradas
+    desde `since`, ou None se não houver credenciais (nada foi buscado).
+    `since` é qualquer data aceita pelo JQL: absoluta ('yyyy-MM-dd HH:mm') ou relativa ('-15m').
+    """
+    jira = _get_jira_client()
+    if not jira: return None
+
+    jql = f'project = "{project_key}"'
+    if since:
+        jql += f' AND updated >= "{since}"'
+    jql += " ORDER BY updated ASC"
+
+    return _iter_issue_texts(_search_jql(jira, jql, "summary,description,updated", page_size))
+
+def _iter_issue_texts(issues):
+    for issue in issues:
+        fields = issue.get('fields', {})
+        yield issue['key'], fields.get('summary') or "", _adf_to_text(fields.get('description')), fields.get('updated') or ""
+
+def list_jira_issue_keys(project_key, page_size=1000):
+    """
+    Lista as keys de todas as issues do projeto (detecta excluídas/movidas).
+    Retorna None se não houver credenciais.
+    """
+    jira = _get_jira_client()
+    if not jira: return None
+    return [issue['key'] for issue in _search_jql(jira, f'project = "{project_key}"', "id", page_size)]
+
 def _get_project_specific_story_id(jira, project_key):
     try:
         project_data = jira.get(f"rest/api/2/project/{project_key}")